@@ -13,9 +13,14 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from .sky import rand_rotation_matrix, rotate_radec  # noqa
+from .sky import (rand_rotation_matrices, rand_rotation_matrix,  # noqa
+                  rotate_radec, rotate_radec_batch)
 from .paths import Paths  # noqa
+from .importance_sampler import bias_from_density  # noqa
+from .field import evaluate_sky, evaluate_sky_rotated  # noqa
+from .utils import load_event_field  # noqa
 
+import numpy
 from astropy.cosmology import FlatLambdaCDM
 
 
@@ -33,3 +38,26 @@ paths_glamdring = {
 
 cosmo_csiborg = FlatLambdaCDM(H0=70.5, Om0=0.307, Ob0=0.04825, Tcmb0=2.728,
                               Neff=3.046, m_nu=0.0, name='csiborg')
+
+# Lookup table for the comoving distance, which covers the redshift range of
+# the GW events with error well below the posterior sample noise.
+_Z_GRID = numpy.linspace(0.0, 0.2, 4096)
+_DC_GRID = cosmo_csiborg.comoving_distance(_Z_GRID).value
+
+
+def comoving_distance_fast(z):
+    r"""
+    Comoving distance in the CSiBORG cosmology, interpolated from a lookup
+    table instead of integrating per sample.
+
+    Parameters
+    ----------
+    z : float or 1-dimensional array
+        Redshift. Must be within `[0, 0.2]`.
+
+    Returns
+    -------
+    dist : float or 1-dimensional array
+        Comoving distance in :math:`\mathrm{Mpc}`.
+    """
+    return numpy.interp(z, _Z_GRID, _DC_GRID)
@@ -0,0 +1,183 @@
+# Copyright (C) 2023 Richard Stiskalek
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Field interpolation at sky positions with a PCS (piecewise cubic spline)
+mass-assignment kernel.
+"""
+from math import floor
+
+import numpy
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# CSiBORG box size in Mpc / h. The observer sits at the box centre.
+BOXSIZE_CSIBORG = 677.7
+
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def _pcs_1d(s):
+        """1-dimensional PCS weight at (signed) cell-centre distance `s`."""
+        s = abs(s)
+        if s < 1.0:
+            return (4.0 - 6.0 * s * s + 3.0 * s * s * s) / 6.0
+        if s < 2.0:
+            d = 2.0 - s
+            return d * d * d / 6.0
+        return 0.0
+
+    @njit(fastmath=True, cache=True)
+    def _interp_pcs(field, u, v, w):
+        """PCS-interpolate a periodic `field` at grid coordinates."""
+        grid = field.shape[0]
+        i0 = int(floor(u))
+        j0 = int(floor(v))
+        k0 = int(floor(w))
+        val = 0.0
+        for di in range(-1, 3):
+            i = i0 + di
+            wx = _pcs_1d(u - i)
+            i %= grid
+            for dj in range(-1, 3):
+                j = j0 + dj
+                wxy = wx * _pcs_1d(v - j)
+                j %= grid
+                for dk in range(-1, 3):
+                    k = k0 + dk
+                    val += wxy * _pcs_1d(w - k) * field[i, j, k % grid]
+        return val
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _evaluate_cart(field, pos, scale, half, out):
+        """Evaluate `field` at Cartesian positions `pos` in the same units
+        as `half` (half the box size)."""
+        for n in prange(pos.shape[0]):
+            u = (pos[n, 0] + half) * scale - 0.5
+            v = (pos[n, 1] + half) * scale - 0.5
+            w = (pos[n, 2] + half) * scale - 0.5
+            out[n] = _interp_pcs(field, u, v, w)
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _evaluate_rotated(field, dist, xyz, rotmats, scale, half, out):
+        """Evaluate `field` at unit vectors `xyz` scaled by `dist`, under
+        every rotation in `rotmats`, without materializing the rotated
+        positions."""
+        for r in prange(rotmats.shape[0]):
+            for n in range(dist.size):
+                x = (rotmats[r, 0, 0] * xyz[n, 0]
+                     + rotmats[r, 0, 1] * xyz[n, 1]
+                     + rotmats[r, 0, 2] * xyz[n, 2])
+                y = (rotmats[r, 1, 0] * xyz[n, 0]
+                     + rotmats[r, 1, 1] * xyz[n, 1]
+                     + rotmats[r, 1, 2] * xyz[n, 2])
+                z = (rotmats[r, 2, 0] * xyz[n, 0]
+                     + rotmats[r, 2, 1] * xyz[n, 1]
+                     + rotmats[r, 2, 2] * xyz[n, 2])
+                u = (dist[n] * x + half) * scale - 0.5
+                v = (dist[n] * y + half) * scale - 0.5
+                w = (dist[n] * z + half) * scale - 0.5
+                out[r, n] = _interp_pcs(field, u, v, w)
+        return out
+
+
+def warmup():
+    """
+    Run tiny inputs through the jitted kernels so the compile (or cache
+    load) cost is paid up front rather than inside the main loop.
+    """
+    if njit is None:
+        return
+    # Match the production dtypes -- float32 fields and posterior samples,
+    # float64 rotation matrices -- so this compiles the specializations the
+    # main loop actually calls, not spurious all-float64 ones.
+    field = numpy.zeros((4, 4, 4), dtype=numpy.float32)
+    pos = numpy.zeros((1, 3), dtype=numpy.float32)
+    evaluate_sky(field, pos, boxsize=1.0)
+    zero = numpy.zeros(1, dtype=numpy.float32)
+    evaluate_sky_rotated(field, zero, zero, zero, numpy.eye(3)[None],
+                         boxsize=1.0)
+
+
+def _radec_to_cart(ra, dec):
+    """Unit vectors of `ra`, `dec` in radians, shape `(n, 3)`."""
+    cdec = numpy.cos(dec)
+    return numpy.stack([cdec * numpy.cos(ra),
+                        cdec * numpy.sin(ra),
+                        numpy.sin(dec)], axis=-1)
+
+
+def evaluate_sky(field, pos, boxsize=BOXSIZE_CSIBORG):
+    r"""
+    Evaluate a field at sky positions with the PCS kernel, assuming the
+    observer at the box centre and periodic wrapping.
+
+    Parameters
+    ----------
+    field : 3-dimensional array
+        Field on a regular cubic grid.
+    pos : 2-dimensional array of shape `(n, 3)`
+        Columns are the comoving distance in :math:`\mathrm{Mpc}/h`, RA and
+        dec in radians.
+    boxsize : float, optional
+        Box size in :math:`\mathrm{Mpc}/h`.
+
+    Returns
+    -------
+    val : 1-dimensional array
+    """
+    if njit is None:
+        raise RuntimeError("`evaluate_sky` requires numba.")
+    cart = _radec_to_cart(pos[:, 1], pos[:, 2])
+    cart *= pos[:, 0].reshape(-1, 1)
+    out = numpy.empty(pos.shape[0], dtype=field.dtype)
+    return _evaluate_cart(field, cart, field.shape[0] / boxsize,
+                          boxsize / 2, out)
+
+
+def evaluate_sky_rotated(field, dist, ra, dec, rotmats,
+                         boxsize=BOXSIZE_CSIBORG):
+    r"""
+    Evaluate a field at sky positions under a batch of rotations. The
+    rotation is fused into the interpolation kernel, so the rotated
+    positions are never materialized.
+
+    Parameters
+    ----------
+    field : 3-dimensional array
+        Field on a regular cubic grid.
+    dist : 1-dimensional array
+        Comoving distance in :math:`\mathrm{Mpc}/h`.
+    ra, dec : 1-dimensional arrays
+        Right ascension and declination in radians.
+    rotmats : 3-dimensional array of shape `(nrot, 3, 3)`
+        Rotation matrices.
+    boxsize : float, optional
+        Box size in :math:`\mathrm{Mpc}/h`.
+
+    Returns
+    -------
+    val : 2-dimensional array of shape `(nrot, n)`
+    """
+    if njit is None:
+        raise RuntimeError("`evaluate_sky_rotated` requires numba.")
+    xyz = _radec_to_cart(ra, dec)
+    dist = numpy.ascontiguousarray(dist, dtype=xyz.dtype)
+    out = numpy.empty((rotmats.shape[0], dist.size), dtype=field.dtype)
+    return _evaluate_rotated(field, dist, xyz, rotmats,
+                             field.shape[0] / boxsize, boxsize / 2, out)
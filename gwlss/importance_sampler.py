@@ -0,0 +1,110 @@
+# Copyright (C) 2023 Richard Stiskalek
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Density-to-bias models for importance sampling of GW posterior samples.
+"""
+from math import exp, log
+
+import numpy
+from scipy.special import expit
+
+try:
+    from numba import config as numba_config
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Mean matter density of the CSiBORG box in units of the density field.
+RHO_M = 88.11787915
+_LOG_RHO_M = log(RHO_M)
+# Below this size the NumPy path wins over launching a parallel kernel.
+_NUMBA_MIN_SIZE = 10_000
+
+
+if njit is not None:
+    @njit(fastmath=True, cache=True, parallel=True)
+    def _sigmoid_bias_nb(density, a_t, t, out):
+        """Fused log-sigmoid kernel, one memory sweep over `density`."""
+        for i in prange(density.size):
+            x = (log(density[i]) - _LOG_RHO_M - a_t) / t
+            # Evaluate the half of the sigmoid whose exp argument is
+            # bounded, so `exp` never overflows or hits subnormals.
+            if x >= 0.0:
+                out[i] = 1.0 / (1.0 + exp(-x))
+            else:
+                e = exp(x)
+                out[i] = e / (1.0 + e)
+        return out
+
+
+def bias_from_density(density, kind="sigmoid_bias", a_t=0.0, t=1.0, beta=1.0,
+                      dtype=None):
+    r"""
+    Evaluate a bias model at a given matter density.
+
+    For `sigmoid_bias` the bias is
+    :math:`\sigma((\log(\rho / \rho_m) - a_t) / t)`, with :math:`\sigma`
+    the logistic sigmoid, evaluated via `scipy.special.expit` which is
+    numerically stable for large negative arguments. For `simple_bias` the
+    bias is :math:`(\rho / \rho_m)^\beta`.
+
+    Parameters
+    ----------
+    density : float or n-dimensional array
+        Matter density.
+    kind : str, optional
+        Bias model, one of `sigmoid_bias` or `simple_bias`.
+    a_t : float, optional
+        Sigmoid log-density threshold.
+    t : float, optional
+        Sigmoid width.
+    beta : float, optional
+        Power-law index of `simple_bias`.
+    dtype : dtype, optional
+        Output dtype. If `None`, keep the intermediate precision.
+
+    Returns
+    -------
+    bias : float or n-dimensional array
+    """
+    if kind == "sigmoid_bias":
+        if numpy.isscalar(density):
+            # Scalar `math` calls skip the ufunc dispatch overhead, which
+            # matters when called per-sample inside an MCMC loop.
+            x = (log(density) - _LOG_RHO_M - a_t) / t
+            if x >= 0.0:
+                bias = 1.0 / (1.0 + exp(-x))
+            else:
+                e = exp(x)
+                bias = e / (1.0 + e)
+        elif (njit is not None and isinstance(density, numpy.ndarray)
+                and density.size > _NUMBA_MIN_SIZE and numba_config.USING_SVML):  # noqa
+            out = numpy.empty(density.size, dtype=numpy.float64)
+            _sigmoid_bias_nb(density.reshape(-1), a_t, t, out)
+            bias = out.reshape(density.shape)
+        else:
+            bias = expit((numpy.log(density) - _LOG_RHO_M - a_t) / t)
+    elif kind == "simple_bias":
+        if numpy.isscalar(density) or float(beta).is_integer():
+            bias = (density / RHO_M)**beta
+        else:
+            # Power via log-exp is cheaper than `pow` on vectors.
+            bias = numpy.exp(beta * (numpy.log(density) - _LOG_RHO_M))
+    else:
+        raise ValueError(f"Unknown bias kind `{kind}`.")
+
+    if dtype is not None:
+        bias = numpy.asarray(bias, dtype=dtype)
+    return bias
@@ -13,13 +13,44 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+from functools import lru_cache
 from os import makedirs
 from os.path import isdir, join
 from warnings import warn
 
+import numpy
 from h5py import File
 
 
+@lru_cache(maxsize=4)
+def _load_event_samples(fpath):
+    """
+    Read all posterior samples of an event from `fpath` into a dictionary of
+    float32 arrays in a single pass over the file. Cached so that repeated
+    calls within a process do not re-read and re-decompress the file. The
+    float32 cast halves the bandwidth of every downstream sweep over the
+    samples, at precision far below the posterior width.
+
+    Parameters
+    ----------
+    fpath : str
+        Path to the event file.
+
+    Returns
+    -------
+    samples : dict of 1-dimensional arrays
+    """
+    with File(fpath, 'r') as f:
+        samples = f["samples"]
+        if hasattr(samples, "keys"):
+            return {key: numpy.asarray(samples[key][:], dtype=numpy.float32)
+                    for key in samples.keys()}
+        # Structured dataset: one bulk read, then split by column.
+        data = samples[:]
+        return {name: numpy.asarray(data[name], dtype=numpy.float32)
+                for name in data.dtype.names}
+
+
 class Paths:
     """
     Object for handling paths to data for the GW-LSS project.
@@ -32,6 +63,17 @@ class Paths:
     def __init__(self, paths_dict):
         assert isinstance(paths_dict, dict)
         self._paths_dict = paths_dict
+        self._known_dirs = set()
+
+    def _ensure_dir(self, fdir):
+        """Create `fdir` if needed, checking the file system only once per
+        directory per instance."""
+        if fdir in self._known_dirs:
+            return
+        if not isdir(fdir):
+            makedirs(fdir)
+            warn(f"Created directory `{fdir}`.", UserWarning, stacklevel=1)
+        self._known_dirs.add(fdir)
 
     def load_event(self, event):
         r"""
@@ -44,10 +86,10 @@ class Paths:
 
         Returns
         -------
-        path : str
+        samples : dict of 1-dimensional arrays
         """
         if event == "GW170817":
-            return File(self["GW170817_darkPE"], 'r')["samples"]
+            return _load_event_samples(self["GW170817_darkPE"])
         else:
             raise KeyError(f"Event `{event}` not found.")
 
@@ -81,17 +123,15 @@ class Paths:
         path : str
         """
         fdir = join(self["dumpdir"], "evaluated")
-        if not isdir(fdir):
-            makedirs(fdir)
-            warn(f"Created directory `{fdir}`.", UserWarning, stacklevel=1)
+        self._ensure_dir(fdir)
         if is_rand:
             event = "rand_" + event
         if in_rsp:
             kind = kind + "_rsp"
-        fname = f"{event}_{kind}_{MAS}_{str(nsim).zfill(5)}_grid{grid}.npy"
+        fname = f"{event}_{kind}_{MAS}_{str(nsim).zfill(5)}_grid{grid}.npz"
         if smooth_scale is not None and smooth_scale > 0:
             smooth_scale = float(smooth_scale)
-            fname = fname.replace(".npy", f"smooth{smooth_scale}.npy")
+            fname = fname.replace(".npz", f"smooth{smooth_scale}.npz")
         return join(fdir, fname)
 
     def __getitem__(self, name):
@@ -15,8 +15,10 @@
 """
 Sky coordinates related functions.
 """
-import healpy
+from math import cos, pi, sin, sqrt
+
 import numpy
+from scipy.spatial.transform import Rotation
 
 
 def rand_rotation_matrix(deflection=1.0, seed=None):
@@ -28,8 +30,9 @@ def rand_rotation_matrix(deflection=1.0, seed=None):
     deflection : float, optional
         The magnitude of the rotation. For 0, no rotation; for 1, competely
         random rotation.
-    seed : int, optional
-        Random seed.
+    seed : int or numpy random generator, optional
+        Random seed. Pass an existing generator to reuse its state across
+        calls instead of constructing a fresh one each time.
 
     Returns
     -------
@@ -39,30 +42,86 @@ def rand_rotation_matrix(deflection=1.0, seed=None):
     ----------
     [1] http://blog.lostinmyterminal.com/python/2015/05/12/random-rotation-matrix.html  # noqa
     """
-    gen = numpy.random.RandomState(seed)
-    randnums = gen.uniform(size=(3,))
+    gen = numpy.random.default_rng(seed)
+    # For a completely random rotation defer to SciPy's compiled sampler.
+    if deflection == 1.0:
+        return Rotation.random(random_state=gen).as_matrix()
 
-    theta, phi, z = randnums
+    theta, phi, z = gen.uniform(size=(3,))
 
-    theta = theta * 2.0 * deflection * numpy.pi  # Rotation about the pole (Z)
-    phi = phi * 2.0*numpy.pi                     # Direction of pole deflection
-    z = z * 2.0 * deflection                     # Magnitude of pole deflection
+    theta = theta * 2.0 * deflection * pi  # Rotation about the pole (Z)
+    phi = phi * 2.0 * pi                   # Direction of pole deflection
+    z = z * 2.0 * deflection               # Magnitude of pole deflection
     # Compute a vector V used for distributing points over the sphere
     # via the reflection I - V Transpose(V).  This formulation of V
     # will guarantee that if x[1] and x[2] are uniformly distributed,
     # the reflected points will be uniform on the sphere.  Note that V
     # has length sqrt(2) to eliminate the 2 in the Householder matrix.
+    r = sqrt(z)
+    Vx, Vy, Vz = sin(phi) * r, cos(phi) * r, sqrt(2.0 - z)
+    st = sin(theta)
+    ct = cos(theta)
+    # The rotation matrix (V Transpose(V) - I) R with R the rotation by
+    # `theta` about Z, expanded to straight-line scalar arithmetic to avoid
+    # allocating the three intermediate 3x3 arrays.
+    return numpy.array(
+        [[(Vx * Vx - 1) * ct - Vx * Vy * st,
+          (Vx * Vx - 1) * st + Vx * Vy * ct,
+          Vx * Vz],
+         [Vx * Vy * ct - (Vy * Vy - 1) * st,
+          Vx * Vy * st + (Vy * Vy - 1) * ct,
+          Vy * Vz],
+         [Vx * Vz * ct - Vy * Vz * st,
+          Vx * Vz * st + Vy * Vz * ct,
+          Vz * Vz - 1]])
+
+
+def rand_rotation_matrices(n, deflection=1.0, seed=None):
+    """
+    Create `n` random rotation matrices at once. Vectorized equivalent of
+    calling :func:`rand_rotation_matrix` `n` times.
+
+    Parameters
+    ----------
+    n : int
+        Number of rotation matrices.
+    deflection : float, optional
+        The magnitude of the rotation. For 0, no rotation; for 1, competely
+        random rotation.
+    seed : int or numpy random generator, optional
+        Random seed. Pass an existing generator to reuse its state across
+        calls instead of constructing a fresh one each time.
+
+    Returns
+    -------
+    rotmats : 3-dimensional array of shape `(n, 3, 3)`
+    """
+    gen = numpy.random.default_rng(seed)
+    if deflection == 1.0:
+        return Rotation.random(num=n, random_state=gen).as_matrix()
+
+    theta, phi, z = gen.uniform(size=(3, n))
+
+    theta *= 2.0 * deflection * pi
+    phi *= 2.0 * pi
+    z *= 2.0 * deflection
+
     r = numpy.sqrt(z)
-    Vx, Vy, Vz = V = (numpy.sin(phi) * r,
-                      numpy.cos(phi) * r,
-                      numpy.sqrt(2.0 - z))
+    Vx, Vy, Vz = numpy.sin(phi) * r, numpy.cos(phi) * r, numpy.sqrt(2.0 - z)
     st = numpy.sin(theta)
     ct = numpy.cos(theta)
 
-    R = numpy.array(((ct, st, 0), (-st, ct, 0), (0, 0, 1)))
-    # Construct the rotation matrix  ( V Transpose(V) - I ) R.
-    M = (numpy.outer(V, V) - numpy.eye(3)).dot(R)
-    return M
+    rotmats = numpy.empty((n, 3, 3))
+    rotmats[:, 0, 0] = (Vx * Vx - 1) * ct - Vx * Vy * st
+    rotmats[:, 0, 1] = (Vx * Vx - 1) * st + Vx * Vy * ct
+    rotmats[:, 0, 2] = Vx * Vz
+    rotmats[:, 1, 0] = Vx * Vy * ct - (Vy * Vy - 1) * st
+    rotmats[:, 1, 1] = Vx * Vy * st + (Vy * Vy - 1) * ct
+    rotmats[:, 1, 2] = Vy * Vz
+    rotmats[:, 2, 0] = Vx * Vz * ct - Vy * Vz * st
+    rotmats[:, 2, 1] = Vx * Vz * st + Vy * Vz * ct
+    rotmats[:, 2, 2] = Vz * Vz - 1
+    return rotmats
 
 
 def rotate_radec(ra, dec, rotmat):
@@ -86,9 +145,48 @@ def rotate_radec(ra, dec, rotmat):
     dec_rot : array-like
         Rotated declination.
     """
-    dec_rot, ra_rot = healpy.rotator.rotateDirection(
-        rotmat, ra - numpy.pi, numpy.pi / 2 - dec)
+    # Convert to Cartesian unit vectors, rotate and convert back, instead of
+    # going through healpy whose colatitude convention forced extra
+    # full-array shifts on both sides of the call.
+    cdec = numpy.cos(dec)
+    xyz = numpy.stack([cdec * numpy.cos(ra),
+                       cdec * numpy.sin(ra),
+                       numpy.sin(dec)])
+    rot = rotmat @ xyz
+    dec_rot = numpy.arcsin(rot[2])
+    ra_rot = numpy.arctan2(rot[1], rot[0]) % (2 * pi)
+    return ra_rot, dec_rot
+
+
+def rotate_radec_batch(ra, dec, rotmats):
+    """
+    Rotate a set of `ra`, `dec` by a batch of rotation matrices in a single
+    batched matrix multiplication. Assume RA is in `[0, 2pi]` and dec is in
+    `[-pi/2, pi/2]`.
+
+    Parameters
+    ----------
+    ra : 1-dimensional array
+        Right ascension.
+    dec : 1-dimensional array
+        Declination.
+    rotmats : 3-dimensional array of shape `(nrot, 3, 3)`
+        Rotation matrices.
 
-    dec_rot -= numpy.pi / 2
-    ra_rot += numpy.pi
+    Returns
+    -------
+    ra_rot : 2-dimensional array of shape `(nrot, n)`
+        Rotated right ascension.
+    dec_rot : 2-dimensional array of shape `(nrot, n)`
+        Rotated declination.
+    """
+    # Convert to Cartesian unit vectors once, rotate all at once and convert
+    # back, instead of doing the trigonometry per rotation.
+    cdec = numpy.cos(dec)
+    xyz = numpy.stack([cdec * numpy.cos(ra),
+                       cdec * numpy.sin(ra),
+                       numpy.sin(dec)])
+    rot = numpy.einsum("rij,jn->rin", rotmats, xyz)
+    dec_rot = numpy.arcsin(rot[:, 2])
+    ra_rot = numpy.arctan2(rot[:, 1], rot[:, 0]) % (2 * pi)
     return ra_rot, dec_rot
@@ -0,0 +1,82 @@
+# Copyright (C) 2023 Richard Stiskalek
+# This program is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Utility functions for loading evaluated fields.
+"""
+import numpy
+
+
+def load_event_field(paths, event, kind, nsims, grid, MAS="PCS",
+                     is_rand=False, in_rsp=True, smooth_scales=None,
+                     dtype=None):
+    r"""
+    Load the evaluated field of an event for a set of simulations and
+    smoothing scales into a single preallocated array. Each archive is
+    decompressed directly into its output slice, so no intermediate
+    per-file copies are kept around.
+
+    Parameters
+    ----------
+    paths : :py:class:`gwlss.Paths`
+        Paths object.
+    event : str
+        Event name.
+    kind : str
+        Field type.
+    nsims : list of int
+        Simulation indices.
+    grid : int
+        Grid size.
+    MAS : str, optional
+        Mass-assignment scheme.
+    is_rand : bool, optional
+        Whether the event is randomly rotated.
+    in_rsp : bool, optional
+        Whether the calculation is performed in redshift space.
+    smooth_scales : list of float, optional
+        Smoothing scales in :math:`\mathrm{Mpc}/h`. If `None`, the
+        unsmoothed field is loaded.
+    dtype : dtype, optional
+        Output dtype. By default the dtype of the stored files.
+
+    Returns
+    -------
+    out : n-dimensional array
+        Array whose leading axes are `(len(nsims), len(smooth_scales))`.
+    """
+    smooth_scales = [None] if smooth_scales is None else list(smooth_scales)
+    # Probe the first file for the per-file shape and dtype, then stream the
+    # remaining files straight into the preallocated output.
+    fpath = paths.evaluated_field(event, kind, nsims[0], grid, MAS=MAS,
+                                  is_rand=is_rand, in_rsp=in_rsp,
+                                  smooth_scale=smooth_scales[0])
+    with numpy.load(fpath) as f:
+        first = f["values"]
+        if dtype is None:
+            dtype = first.dtype
+        out = numpy.empty((len(nsims), len(smooth_scales), *first.shape),
+                          dtype=dtype)
+        out[0, 0] = first
+
+    for n, nsim in enumerate(nsims):
+        for k, smooth_scale in enumerate(smooth_scales):
+            if n == 0 and k == 0:
+                continue
+            fpath = paths.evaluated_field(event, kind, nsim, grid, MAS=MAS,
+                                          is_rand=is_rand, in_rsp=in_rsp,
+                                          smooth_scale=smooth_scale)
+            with numpy.load(fpath) as f:
+                out[n, k] = f["values"]
+    return out
@@ -13,9 +13,17 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-import csiborgtools
-import numpy
-from tqdm import trange
+import os
+
+# Persist numba's compiled kernels on disk so repeated launches (e.g. one
+# per MPI rank) load them from cache instead of recompiling.
+os.environ.setdefault(
+    "NUMBA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 "__numba_cache__"))
+
+import csiborgtools  # noqa: E402
+import numpy  # noqa: E402
 
 try:
     import gwlss
@@ -49,22 +57,72 @@ def load_field(kind, nsim, grid, MAS, in_rsp=False, smooth_scale=None):
     field : n-dimensional array
     """
     paths = csiborgtools.read.Paths(**csiborgtools.paths_glamdring)
-    if kind == "overdensity":
-        isoverdensity = True
+    isoverdensity = kind == "overdensity"
+    if isoverdensity:
         kind = "density"
 
+    # Memory-map the stored field and cast to float32 on the way in, which
+    # halves the RAM footprint and the bandwidth of every downstream sweep.
     field = numpy.load(paths.field(kind, MAS, grid, nsim, in_rsp=in_rsp,
-                                   smooth_scale=smooth_scale))
+                                   smooth_scale=smooth_scale), mmap_mode="r")
+    field = field.astype(numpy.float32, copy=True)
     if isoverdensity:
-        field /= field.mean()
+        # Accumulate the mean in float64 and normalize in place.
+        mean = float(field.mean(dtype=numpy.float64))
+        numpy.multiply(field, numpy.float32(1.0 / mean), out=field)
 
     return field
 
 
-def evaluate_event(event, kind, nsim, smooth_scale=None, to_save=True,
+def load_field_multi(kind, nsim, grid, MAS, smooth_scales, in_rsp=False):
+    r"""
+    Load a single CSiBORG field and smooth it at several scales, sharing a
+    single forward FFT across all scales.
+
+    Parameters
+    ----------
+    kind : str
+        Field kind.
+    nsim : int
+        Simulation index.
+    grid : int
+        Grid size.
+    MAS : str
+        Mass assignment scheme.
+    smooth_scales : list of float
+        Smoothing scales in :math:`\mathrm{Mpc} / h`. `None` or 0 yields the
+        unsmoothed field.
+    in_rsp : bool, optional
+        Whether to load the field in redshift space.
+
+    Yields
+    ------
+    field : n-dimensional array
+    """
+    field = load_field(kind, nsim, grid, MAS, in_rsp=in_rsp)
+    boxsize = gwlss.field.BOXSIZE_CSIBORG
+    fhat, k2 = None, None
+    for smooth_scale in smooth_scales:
+        if smooth_scale is None or smooth_scale == 0:
+            yield field
+            continue
+        if fhat is None:
+            # The forward FFT and the |k|^2 grid are scale-independent.
+            fhat = numpy.fft.rfftn(field)
+            kx = 2 * numpy.pi * numpy.fft.fftfreq(grid, d=boxsize / grid)
+            kz = 2 * numpy.pi * numpy.fft.rfftfreq(grid, d=boxsize / grid)
+            k2 = (kx[:, None, None]**2 + kx[None, :, None]**2
+                  + kz[None, None, :]**2)
+        kernel = numpy.exp(-0.5 * smooth_scale**2 * k2)
+        yield numpy.fft.irfftn(fhat * kernel, s=field.shape,
+                               axes=(0, 1, 2)).astype(field.dtype)
+
+
+def evaluate_event(event, kind, nsim, smooth_scales=None, to_save=True,
                    nrot=None, verbose=True, seed=None):
     r"""
-    Evaluate a CSiBORG field at the positions of a given event.
+    Evaluate a CSiBORG field at the positions of a given event, optionally
+    for several smoothing scales at once.
 
     Parameters
     ----------
@@ -74,8 +132,8 @@ def evaluate_event(event, kind, nsim, smooth_scale=None, to_save=True,
         Field kind.
     nsim : int
         Simulation index.
-    smooth_scale : float, optional
-        Smoothing scale in :math:`\mathrm{Mpc} / h`.
+    smooth_scales : float or list of float, optional
+        Smoothing scale(s) in :math:`\mathrm{Mpc} / h`.
     to_save : bool, optional
         Whether to save the result.
     nrot : int, optional
@@ -87,50 +145,62 @@ def evaluate_event(event, kind, nsim, smooth_scale=None, to_save=True,
 
     Returns
     -------
-    val : 1-dimensional array
-        Field values at the event positions.
+    vals : list of arrays
+        Field values at the event positions, one array per smoothing scale.
     """
+    if not isinstance(smooth_scales, (list, tuple)):
+        smooth_scales = [smooth_scales]
     # First load the event
     paths = gwlss.Paths(gwlss.paths_glamdring)
     samples = paths.load_event(event)
-    ra0 = samples["ra"][:]
-    dec0 = samples["dec"][:]
-    dist = gwlss.cosmo_csiborg.comoving_distance(samples["redshift"][:]).value
-    # Then load the CSiBORG field
+    ra0 = samples["ra"]
+    dec0 = samples["dec"]
+    # Comoving distance in Mpc / h to match the box units, float32 to match
+    # the posterior samples.
+    dist = gwlss.comoving_distance_fast(samples["redshift"])
+    dist = (dist * gwlss.cosmo_csiborg.h).astype(numpy.float32)
     grid = 256
-    csiborg_paths = csiborgtools.read.Paths(**csiborgtools.paths_glamdring)
-    field = load_field(kind, nsim, grid, "PCS", in_rsp=True,
-                       smooth_scale=smooth_scale)
-    box = csiborgtools.read.CSiBORGBox(
-        max(csiborg_paths.get_snapshots(nsim)), nsim, csiborg_paths)
-    # Create the position array
-    pos = numpy.vstack([dist, ra0, dec0]).T
-    # Either evaluate it straight away or rotate the event randomly.
+    # The positions (and rotations) are shared by all smoothing scales.
     if nrot is None:
-        val = csiborgtools.field.evaluate_sky(field, pos=pos, box=box,
-                                              isdeg=False)
+        # Preallocate a contiguous float32 position buffer and fill it by
+        # column, instead of the vstack + transpose which leaves a
+        # non-contiguous view that the evaluator would copy again.
+        pos = numpy.empty((ra0.size, 3), dtype=numpy.float32)
+        pos[:, 0] = dist
+        pos[:, 1] = ra0
+        pos[:, 2] = dec0
     else:
         assert isinstance(nrot, int)
-        val = numpy.full((nrot, ra0.size), numpy.nan)
-        for i in trange(nrot) if verbose else range(nrot):
-            rotmat = gwlss.rand_rotation_matrix(seed=seed)
-            ra_rot, dec_rot = gwlss.rotate_radec(ra0, dec0, rotmat)
-            pos[:, 1] = ra_rot
-            pos[:, 2] = dec_rot
-            val[i, :] = csiborgtools.field.evaluate_sky(field, pos=pos,
-                                                        box=box, isdeg=False)
-
-    if to_save:
-        fout = paths.evaluated_field("GW170817", kind, nsim, grid,
-                                     is_rand=nrot is not None,
-                                     smooth_scale=smooth_scale)
-        if verbose:
-            print(f"Saving output to `{fout}`.", flush=True)
-        numpy.save(fout, val)
-
-    return val
+        rotmats = gwlss.rand_rotation_matrices(nrot, seed=seed)
+
+    vals = []
+    fields = load_field_multi(kind, nsim, grid, "PCS", smooth_scales,
+                              in_rsp=True)
+    for smooth_scale, field in zip(smooth_scales, fields):
+        if nrot is None:
+            val = gwlss.evaluate_sky(field, pos)
+        else:
+            # The rotations are fused into the interpolation kernel, so the
+            # rotated positions are never materialized.
+            val = gwlss.evaluate_sky_rotated(field, dist, ra0, dec0, rotmats)
+
+        if to_save:
+            fout = paths.evaluated_field("GW170817", kind, nsim, grid,
+                                         is_rand=nrot is not None,
+                                         smooth_scale=smooth_scale)
+            if verbose:
+                print(f"Saving output to `{fout}`.", flush=True)
+            # Compressed archive with summary statistics alongside, so that
+            # downstream plotting can grab them without touching `values`.
+            numpy.savez_compressed(fout, values=val,
+                                   mean=val.mean(dtype=numpy.float64),
+                                   std=val.std(dtype=numpy.float64))
+        vals.append(val)
+
+    return vals
 
 
 if __name__ == "__main__":
+    gwlss.field.warmup()
     if True:
         evaluate_event("GW170817", "overdensity", 7444, nrot=100)
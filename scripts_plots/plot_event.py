@@ -15,18 +15,54 @@
 """
 Plot event posterior localisation samples.
 """
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy
-import scienceplots  # noqa
+from matplotlib.lines import Line2D
 
 import utils
 
-try:
-    import gwlss
-except ImportError:
-    import sys
-    sys.path.append("../")
-    import gwlss
+gwlss = None
+
+
+def _import_gwlss():
+    """
+    Import `gwlss` on first use, falling back to the parent directory, so
+    that importing this module does not pull in the astropy/h5py stack.
+    """
+    global gwlss
+    if gwlss is None:
+        try:
+            import gwlss
+        except ImportError:
+            import sys
+            sys.path.append("../")
+            import gwlss
+    return gwlss
+
+
+def _load_values(fpath):
+    """
+    Read the `values` array from an evaluated-field archive, cast to
+    float32 to halve the footprint of the stacked data and the bandwidth
+    of every histogram pass over it.
+    """
+    with numpy.load(fpath) as f:
+        return numpy.asarray(f["values"], dtype=numpy.float32)
+
+
+def _unique_sky_pixels(ra, dec, width=2000):
+    """
+    Indices keeping at most one sample per output pixel on the full sky, for
+    decimating dense scatter plots whose overlapping points would saturate
+    the pixel anyway. `width` is the pixel resolution across `2 pi` in RA.
+    """
+    height = width // 2
+    ix = (ra * (width / (2 * numpy.pi))).astype(numpy.int32)
+    iy = ((dec + numpy.pi / 2) * (height / numpy.pi)).astype(numpy.int32)
+    return numpy.unique(ix * (height + 1) + iy, return_index=True)[1]
 
 
 def plot_event_localisation(event):
@@ -38,48 +74,43 @@ def plot_event_localisation(event):
     event : str
         Event name.
     """
+    _import_gwlss()
     paths = gwlss.Paths(gwlss.paths_glamdring)
     samples = paths.load_event(event)
+    em_counterpart = gwlss.EM_counterpart.get(event)
 
-    with plt.style.context(utils.mplstyle):
+    with matplotlib.rc_context(utils.rc_cached):
         plt.figure()
 
         plt.hist(samples["redshift"], bins="auto")
-        try:
-            plt.axvline(gwlss.EM_counterpart[event]["redshift"], c="red",
+        if em_counterpart is not None:
+            plt.axvline(em_counterpart["redshift"], c="red",
                         label="EM counterpart")
             plt.legend()
-        except KeyError:
-            pass
         plt.xlabel(r"$z$")
         plt.ylabel("Counts")
 
         plt.tight_layout()
-        for ext in utils.ext:
-            fout = f"../plots/{event}_redshift.{ext}"
-            print(f"Saving to `{fout}`.")
-            plt.savefig(fout, dpi=utils.dpi)
+        utils.save_all(plt.gcf(), f"{event}_redshift")
         plt.close()
 
-    with plt.style.context(utils.mplstyle):
+    # Convert to degrees once, in float32, instead of per scatter argument.
+    ra = numpy.multiply(samples["ra"], 180.0 / numpy.pi,
+                        dtype=numpy.float32)
+    dec = numpy.multiply(samples["dec"], 180.0 / numpy.pi,
+                         dtype=numpy.float32)
+    with matplotlib.rc_context(utils.rc_cached):
         plt.figure()
-        plt.scatter(numpy.rad2deg(samples['ra']),
-                    numpy.rad2deg(samples['dec']), s=0.01)
-        try:
-            plt.scatter(gwlss.EM_counterpart[event]["RA"],
-                        gwlss.EM_counterpart[event]["dec"], c="red",
+        plt.scatter(ra, dec, s=0.01)
+        if em_counterpart is not None:
+            plt.scatter(em_counterpart["RA"], em_counterpart["dec"], c="red",
                         label="EM counterpart", s=5, marker="x")
             plt.legend()
-        except KeyError:
-            pass
         plt.xlabel("RA [deg]")
         plt.ylabel("dec [deg]")
 
         plt.tight_layout()
-        for ext in utils.ext:
-            fout = f"../plots/{event}_sky.{ext}"
-            print(f"Saving to `{fout}`.")
-            plt.savefig(fout, dpi=utils.dpi)
+        utils.save_all(plt.gcf(), f"{event}_sky", dpi=utils.dense_dpi)
         plt.close()
 
 
@@ -94,18 +125,35 @@ def plot_radec_rotated(event, nrot):
     nrot : int
         Number of random rotations.
     """
+    _import_gwlss()
     paths = gwlss.Paths(gwlss.paths_glamdring)
     samples = paths.load_event(event)
-    ra = samples["ra"][:]
-    dec = samples["dec"][:]
+    ra = samples["ra"]
+    dec = samples["dec"]
+    # Draw all rotations at once and rotate in a single batched matrix
+    # multiplication, instead of re-converting the samples per rotation.
+    rotmats = gwlss.rand_rotation_matrices(nrot)
+    ra_rot, dec_rot = gwlss.rotate_radec_batch(ra, dec, rotmats)
+
+    # Collapse the nrot + 1 scatters into a single PathCollection over the
+    # pixel-decimated samples, with the rotation index as the colour.
+    keep = _unique_sky_pixels(ra, dec)
+    ra_all = [ra[keep]]
+    dec_all = [dec[keep]]
+    colors = [numpy.zeros(keep.size)]
+    for i in range(nrot):
+        keep = _unique_sky_pixels(ra_rot[i], dec_rot[i])
+        ra_all.append(ra_rot[i][keep])
+        dec_all.append(dec_rot[i][keep])
+        colors.append(numpy.full(keep.size, i + 1))
+    ra_all = numpy.concatenate(ra_all)
+    dec_all = numpy.concatenate(dec_all)
+    colors = numpy.concatenate(colors)
 
-    with plt.style.context("science"):
+    with matplotlib.rc_context(utils.rc_cached):
         plt.figure()
-        plt.scatter(ra, dec, s=0.05, c="black", rasterized=True)
-        for __ in range(nrot):
-            rotmat = gwlss.rand_rotation_matrix()
-            ra_rot, dec_rot = gwlss.rotate_radec(ra, dec, rotmat)
-            plt.scatter(ra_rot, dec_rot, s=0.05, rasterized=True, alpha=0.5)
+        plt.scatter(ra_all, dec_all, c=colors, cmap="tab20", s=0.05,
+                    rasterized=True, alpha=0.5)
 
         plt.xlim(0, 2 * numpy.pi)
         plt.ylim(-numpy.pi / 2, numpy.pi / 2)
@@ -113,17 +161,15 @@ def plot_radec_rotated(event, nrot):
         plt.ylabel("dec [rad]")
 
         plt.tight_layout()
-        for ext in utils.ext:
-            fout = f"../plots/GW170817_rotate_sky.{ext}"
-            print(f"Saving to `{fout}`.")
-            plt.savefig(fout, dpi=utils.dpi)
+        utils.save_all(plt.gcf(), "GW170817_rotate_sky",
+                       dpi=utils.dense_dpi)
         plt.close()
 
 
-def plot_field(event, kind, nsim, smooth_scale=None):
+def plot_field(event, kind, nsims, smooth_scale=None, fig=None, ax=None):
     r"""
     Plot a CSiBORG field evaluated at locations of the event's posterior
-    localisation samples.
+    localisation samples, for a set of simulations.
 
     Parameters
     ----------
@@ -131,41 +177,98 @@ def plot_field(event, kind, nsim, smooth_scale=None):
         Event name.
     kind : str
         Field kind.
-    nsim : int
-        Simulation index.
+    nsims : list of int
+        Simulation indices.
     smooth_scale : float, optional
         Smoothing scale in :math:`\mathrm{Mpc}/h`.
+    fig, ax : matplotlib figure and axes, optional
+        Existing figure and axes to draw on, cleared before plotting.
+        Useful when sweeping over smoothing scales, so that the figure is
+        not torn down and rebuilt per scale. By default a new figure is
+        created and closed on exit.
     """
+    _import_gwlss()
     paths = gwlss.Paths(gwlss.paths_glamdring)
+    # Load every simulation's values once up front, then histogram them all
+    # with shared bin edges computed from the stacked data. File reads and
+    # decompression release the GIL, so the loads overlap in a thread pool.
+    fpaths = [paths.evaluated_field(event, kind, nsim, 256, is_rand=False,
+                                    smooth_scale=smooth_scale)
+              for nsim in nsims]
+    # Preallocate the stack (shape probed from the first file) and let each
+    # thread decompress straight into its row, so the full data is never
+    # held in two copies as with a list + vstack.
+    first = _load_values(fpaths[0])
+    data = numpy.empty((len(fpaths), first.size), dtype=numpy.float32)
+    data[0] = first
 
-    with plt.style.context("science"):
-        plt.figure()
+    def _fill(i):
+        with numpy.load(fpaths[i]) as f:
+            data[i] = f["values"]
 
-        f = paths.evaluated_field(event, kind, nsim, 256,
-                                  is_rand=False, smooth_scale=smooth_scale)
-        data = numpy.load(f)
-        bins = numpy.linspace(data.min(), data.max() + 2, 50)
-        plt.hist(data, bins=bins, density=1, histtype="step",
-                 label="GW170817")
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        list(ex.map(_fill, range(1, len(fpaths))))
 
-        f = paths.evaluated_field("GW170817", "density", nsim, 256,
-                                  is_rand=True)
-        data = numpy.load(f)
-        for i in range(35):
-            plt.hist(data[i, :], bins=bins, density=1, histtype="step",
-                     label="Random" if i == 0 else None, ls="dotted")
+    with matplotlib.rc_context(utils.rc_cached):
+        owns_fig = fig is None
+        if owns_fig:
+            fig, ax = plt.subplots()
+        else:
+            ax.clear()
 
-        plt.xlabel(r"$\rho / \langle \rho \rangle$")
-        plt.ylabel("Normalized counts")
-        plt.legend()
+        # Fixed uniform edges shared by all histograms below, so the
+        # counting reduces to the fast uniform-binning kernel.
+        lo, hi = data.min(), data.max() + 2
+        edges = numpy.linspace(lo, hi, 50)
+        norm = edges[1] - edges[0]
+        nbins = edges.size - 1
+        # Quantize the whole stack once; each row's histogram then reduces
+        # to a single bincount pass and the aggregate to one more over the
+        # raveled indices, with no further scans of the data.
+        idx = ((data - lo) * (nbins / (hi - lo))).astype(numpy.int32)
+        numpy.clip(idx, 0, nbins - 1, out=idx)
+        # Draw the rows unlabelled and build the legend from proxy artists
+        # afterwards, so no per-row label bookkeeping runs inside the loops.
+        handles = [Line2D([0], [0], color="C0", label="GW170817")]
+        for i in range(len(nsims)):
+            counts = numpy.bincount(idx[i], minlength=nbins)
+            ax.stairs(counts / (counts.sum() * norm), edges)
+        if len(nsims) > 1:
+            counts = numpy.bincount(idx.ravel(), minlength=nbins)
+            ax.stairs(counts / (counts.sum() * norm), edges, color="red")
+            handles.append(Line2D([0], [0], color="red", label="Combined"))
 
-        plt.tight_layout()
-        for ext in utils.ext:
-            fout = f"../plots/GW170817_{kind}.{ext}"
-            print(f"Saving to `{fout}`.")
-            plt.savefig(fout, dpi=utils.dpi)
-        plt.close()
+        fpath = paths.evaluated_field("GW170817", "density", nsims[0], 256,
+                                      is_rand=True)
+        rand_data = _load_values(fpath)[:35]
+        # The random rows share the posterior bounds and bin grid, so they
+        # are quantized once onto the same edges.
+        idx = ((rand_data - lo) * (nbins / (hi - lo))).astype(numpy.int32)
+        numpy.clip(idx, 0, nbins - 1, out=idx)
+        for i in range(len(rand_data)):
+            counts = numpy.bincount(idx[i], minlength=nbins)
+            ax.stairs(counts / (counts.sum() * norm), edges, ls="dotted")
+        handles.append(Line2D([0], [0], c="gray", ls="dotted",
+                              label="Random"))
+
+        ax.set_xlabel(r"$\rho / \langle \rho \rangle$")
+        ax.set_ylabel("Normalized counts")
+        ax.legend(handles=handles)
+
+        fig.tight_layout()
+        stem = f"GW170817_{kind}"
+        if smooth_scale is not None and smooth_scale > 0:
+            stem += f"_smooth{float(smooth_scale)}"
+        utils.save_all(fig, stem)
+        if owns_fig:
+            plt.close(fig)
 
 
 if __name__ == "__main__":
-    pass
+    if True:
+        # Reuse one figure across the smoothing-scale sweep.
+        fig, ax = plt.subplots()
+        for smooth_scale in [None, 1.0, 2.0, 4.0]:
+            plot_field("GW170817", "overdensity", [7444],
+                       smooth_scale=smooth_scale, fig=fig, ax=ax)
+        plt.close(fig)